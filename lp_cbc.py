@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from pulp import COIN_CMD, PULP_CBC_CMD
+
+
+def get_solver(**kwargs):
+    """CBC with parallel branch and cut on every core. Extra keyword arguments go to COIN_CMD.
+
+    A cbc on the PATH (e.g. an AVX2 build) is preferred over the one bundled with PuLP.
+    """
+    return COIN_CMD(
+        path=shutil.which("cbc") or PULP_CBC_CMD().path,
+        msg=0,
+        threads=os.cpu_count(),
+        options=["preprocess sos", "cuts on", "heuristicsOnOff on"],
+        **kwargs,
+    )
+
+
+def cbc_options(solver):
+    """The solver's options as CBC command line arguments, the way PuLP passes them."""
+    return " ".join("-" + option for option in solver.options + solver.getOptions()).split()
+
+
+def run_cbc(model, filename, solver=None):
+    """Runs CBC on a model written as text, in the format of filename's extension (.lp or .mps).
+
+    Returns the PuLP status and the values of the variables by name. CBC only lists the nonzero ones.
+    """
+    solver = solver or get_solver()
+    values = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model_path = os.path.join(tmp_dir, filename)
+        sol_path = os.path.join(tmp_dir, "solution.sol")
+        with open(model_path, "w") as f:
+            f.write(model)
+
+        subprocess.run([solver.path, model_path, *cbc_options(solver), "solve", "solution", sol_path],
+                       stdout=subprocess.DEVNULL, check=True)
+
+        status, _ = solver.get_status(sol_path)
+        with open(sol_path) as f:
+            next(f)  # status line
+            for line in f:
+                fields = line.split()
+                # Infeasible rows are prefixed with **
+                if fields[0] == "**":
+                    fields = fields[1:]
+                values[fields[1]] = round(float(fields[2]))
+    return status, values
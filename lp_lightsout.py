@@ -1,16 +1,18 @@
-import random
+import io
+import sys
+import numpy as np
 from pulp import *
-from itertools import product, chain
+from lp_cbc import run_cbc
+from itertools import product
 from typing import Dict, Generator, Tuple
 
 # Represents a (row, col) coordinate on the board
 Coord = Tuple[int, int]
 # Solution is a mapping of coordinate to times pressed
 Solution = Dict[Coord, int]
-Board = list[list[int]]
-
-# Maps coordinate to the corresponding decision variable
-DecisionVars = Dict[Coord, LpVariable]
+Board = np.ndarray
+# Each row of the board packed into an int, bit c is column c
+Bitboard = list[int]
 
 # Cross shape neighbors from hitting a light:
 #  x
@@ -26,22 +28,17 @@ neighbor_offsets: Coord = [
 
 
 def generate_board(m: int, n: int, moves: int) -> Board:
-    """Generates a solvable lights out initial board state."""
-    board = [[0 for _ in range(m)] for _ in range(n)]
-    for _ in range(moves):
-        row = random.randint(0, m-1)
-        col = random.randint(0, n-1)
-        hit_light(board, row, col)
-    return board
-
-
-def hit_light(board: Board, r: int, c: int, times=1):
-    """Simulates a pressing a light on row c, col c on the board."""
+    """Generates a solvable lights out initial board state.
+
+    All the moves are drawn at once and stamped onto a board padded by one cell on
+    each side, so presses on the edges don't need bounds checks.
+    """
+    rows = np.random.randint(0, m, moves) + 1
+    cols = np.random.randint(0, n, moves) + 1
+    hits = np.zeros((m + 2, n + 2), dtype=np.int64)
     for dy, dx in neighbor_offsets:
-        y, x = r + dy, c + dx
-        if in_bounds(y, x, m, n):
-            board[r + dy][c + dx] += times
-            board[r + dy][c + dx] %= 2
+        np.add.at(hits, (rows + dy, cols + dx), 1)
+    return (hits[1:-1, 1:-1] & 1).astype(np.uint8)
 
 
 def all_coords(m: int, n: int) -> Generator[Coord, None, None]:
@@ -49,76 +46,137 @@ def all_coords(m: int, n: int) -> Generator[Coord, None, None]:
     return product(range(m), range(n))
 
 
-def in_bounds(r: int, c: int, m: int, n: int) -> bool:
-    """Whether a row, col is within the bounds of an M x N board."""
-    return (0 <= r < m) and (0 <= c < n)
+def neighbor_table(m: int, n: int) -> np.ndarray:
+    """Flat indices of the cross neighbors of every cell of an M x N board.
 
-
-def get_all_neighbors(r: int, c: int, m: int, n: int) -> Generator[Coord, None, None]:
-    """Returns the coordinates of the neighboring cells plus the current coordinate."""
+    Row i holds the neighbors of flat cell i, in neighbor_offsets order, with -1 where
+    the neighbor is off the board.
+    """
+    flat_idx = np.arange(m * n).reshape(m, n)
+    rows, cols = np.indices((m, n))
+    table = []
     for dy, dx in neighbor_offsets:
-        if in_bounds(r+dy, c+dx, m, n):
-            yield (r+dy, c+dx)
+        shifted = np.roll(flat_idx, (-dy, -dx), axis=(0, 1))
+        # np.roll wraps around, those are the neighbors off the board
+        off_board = (rows + dy < 0) | (rows + dy >= m) | (cols + dx < 0) | (cols + dx >= n)
+        table.append(np.where(off_board, -1, shifted).ravel())
+    return np.stack(table, axis=1)
 
 
 def print_board(board: Board):
-    for row in board:
-        for col in row:
-            print("■" if col else "□", end="")
-        print()
+    cells = np.where(board, "■", "□")
+    sys.stdout.write("\n".join(map("".join, cells)) + "\n")
+
+
+def var_name(prefix: str, r: int, c: int) -> str:
+    """Name of the decision variable for row r, col c in the LP file."""
+    return f"{prefix}_{r}_{c}"
+
+
+def build_lp_text(board: Board) -> str:
+    """Writes the lights out model in CPLEX LP format.
+
+    Each cell has a binary m_r_c for whether it was pressed, since pressing a light twice
+    is a no-op, and an integer f_r_c so that the initial state plus the presses of its
+    cross neighbors is 2 * f_r_c.
+    """
+    m, n = board.shape
+    out = io.StringIO()
+
+    neighbors = neighbor_table(m, n)
+    initial = board.ravel().astype(np.int64)
+    presses = [var_name("m", r, c) for r, c in all_coords(m, n)]
+    factors = [var_name("f", r, c) for r, c in all_coords(m, n)]
+    constraints = [var_name("c", r, c) for r, c in all_coords(m, n)]
 
+    # The sum can be at most the number of neighbors plus the initial state, so f_r_c is
+    # bounded by half of that. Cells where the bound is 0 don't need an f_r_c at all.
+    factor_bounds = ((neighbors >= 0).sum(axis=1) + initial) // 2
+    has_factor = np.flatnonzero(factor_bounds)
 
-def lights_out_constraints(placement_vars: Dict[Coord, LpVariable], initial_board: list[list[int]]) -> Generator[LpConstraint, None, None]:
-    m, n = len(initial_board), len(initial_board[0])
+    out.write("Minimize\n obj: ")
+    out.write("\n + ".join(presses))
 
-    factor = {(r, c):  LpVariable(f"c{r},{c}", lowBound=0, cat=const.LpInteger)
-              for r, c in all_coords(m, n)}
+    out.write("\nSubject To\n")
+    for i, cell_neighbors in enumerate(neighbors):
+        out.write(f" {constraints[i]}: ")
+        out.write(" + ".join(presses[j] for j in cell_neighbors if j >= 0))
+        if factor_bounds[i] > 0:
+            out.write(f" - 2 {factors[i]}")
+        out.write(f" = {-initial[i]}\n")
 
-    for r, c in all_coords(m, n):
-        initial_state = [initial_board[r][c]]
-        cross_touching = [placement_vars[(y, x)]
-                          for y, x in get_all_neighbors(r, c, m, n)]
-        yield lpSum(initial_state + cross_touching) == 2 * factor[r, c]
+    out.write("Bounds\n")
+    for i in has_factor:
+        out.write(f" {factors[i]} <= {factor_bounds[i]}\n")
 
+    out.write("General\n")
+    for i in has_factor:
+        out.write(f" {factors[i]}\n")
 
-def minimize_moves_objective(placement_vars):
-    return lpSum(list(placement_vars.values()))
+    out.write("Binary\n")
+    for press in presses:
+        out.write(f" {press}\n")
+    out.write("End\n")
+    return out.getvalue()
 
 
-def get_solution(placement_vars) -> Solution:
+def read_solution(values: Dict[str, int]) -> Solution:
+    """Reads the presses out of the values of a CBC solution."""
     solution = {}
-    for (r, c), decision_var in placement_vars.items():
-        times = decision_var.value()
-        if times > 0:
-            solution[(r, c)] = times
+    for name, value in values.items():
+        prefix, r, c = name.split("_")
+        if prefix == "m" and value > 0:
+            solution[(int(r), int(c))] = value
     return solution
 
 
-def apply_solution(board, solution: Solution) -> bool:
-    for (r, c), times in solution.items():
-        hit_light(board, r, c, times=times)
+def to_bitboard(board: Board) -> Bitboard:
+    """Packs each row of the board into an int, with bit c holding column c."""
+    return [int.from_bytes(np.packbits(row, bitorder="little").tobytes(), "little")
+            for row in board]
 
-    return sum(chain(*board)) == 0
 
+def from_bitboard(rows: Bitboard, board: Board):
+    """Unpacks the rows of a bitboard back into the board."""
+    n = board.shape[1]
+    for r, row in enumerate(rows):
+        packed = np.frombuffer(row.to_bytes((n + 7) // 8, "little"), dtype=np.uint8)
+        board[r] = np.unpackbits(packed, count=n, bitorder="little")
+
+
+def hit_light(rows: Bitboard, r: int, c: int, n: int):
+    """Simulates pressing the light on row r, col c of an N column bitboard."""
+    bit = 1 << c
+    # The center and its left and right neighbors, without spilling past column N
+    rows[r] ^= (bit | bit >> 1 | bit << 1) & ((1 << n) - 1)
+    if r > 0:
+        rows[r - 1] ^= bit
+    if r + 1 < len(rows):
+        rows[r + 1] ^= bit
 
-def solve(board: Board) -> Solution | None:
-    """Models lights out game as a linear optimization problem."""
-    m, n = len(board), len(board[0])
-    problem = LpProblem("LightsOut", LpMinimize)
 
-    placement_vars = {(r, c): LpVariable(f"m{r},{c}", lowBound=0, cat=const.LpInteger)
-                      for r, c in all_coords(m, n)}
+def apply_solution(board, solution: Solution) -> bool:
+    rows = to_bitboard(board)
+    n = board.shape[1]
+    for (r, c), times in solution.items():
+        # Pressing a light twice is the same as not pressing it
+        if times & 1:
+            hit_light(rows, r, c, n)
 
-    problem += minimize_moves_objective(placement_vars)
+    from_bitboard(rows, board)
+    return not any(rows)
 
-    for constraint in lights_out_constraints(placement_vars, initial_board=board):
-        problem += constraint
 
-    problem.solve()
-    if LpStatus[problem.status] != "Optimal":
-        return None
+def solve(board: Board) -> Solution | None:
+    """Models lights out game as a linear optimization problem.
 
-    return get_solution(placement_vars)
+    The model is written straight to an LP file and handed to CBC, skipping PuLP's
+    per-constraint model building.
+    """
+    status, values = run_cbc(build_lp_text(board), "lightsout.lp")
+    if LpStatus[status] != "Optimal":
+        return None
+    return read_solution(values)
 
 
 if __name__ == "__main__":
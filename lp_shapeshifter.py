@@ -1,87 +1,161 @@
 from pulp import *
+from collections import Counter
 from itertools import product
-
-
-def can_place(board, piece, r, c):
-    height = len(piece)
-    width = len(piece[0])
-    return ((r + height) <= len(board)) and ((c + width) <= len(board[0]))
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from lp_cbc import get_solver
 
 
 def all_coordinates(board):
     yield from product(range(len(board)), range(len(board[0])))
 
 
-def map_cells_to_pieces(piece_vars, board, pieces):
-    """Maps each coordinate on the board with all the piece(s) that could touch it if they were placed.
+def map_placements(piece_vars, board, pieces):
+    """Maps each piece to its placeable positions, and each coordinate on the board with all the
+    piece(s) that could touch it if they were placed, in a single pass over the pieces.
 
-    The returned touched_by is a list of decision variables that will influence a particular (r, c) on the board. 
-    """
+    The returned placeable is a list of the decision variables of every position a piece fits in,
+    per pid. The returned touched_by is a list of decision variables that will influence a
+    particular (r, c) on the board.
 
-    touched_by = {(r, c): [] for r, c in all_coordinates(board)}
+    Every (placement, piece cell) pair is computed at once with NumPy broadcasting, then the hits are
+    grouped by the board cell they land on.
+    """
+    height, width = len(board), len(board[0])
+    placeable, all_hits, all_vars = [], [], []
     for pid, piece in enumerate(pieces):
         rows, cols = len(piece), len(piece[0])
-        cells = [
-            (r, c) for r, c in product(range(rows), range(cols)) if piece[r][c] == 1
-        ]
-        placements = [
-            (r, c) for r, c in all_coordinates(board) if can_place(board, piece, r, c)
-        ]
-        for r, c in placements:
-            for dy, dx in cells:
-                touched_by[(r + dy, c + dx)].append(piece_vars[pid][r][c])
-    return touched_by
-
-
-def each_piece_used_once(piece_vars, board, pieces):
-    """Constraints for each piece being used exactly once on the board. """
-    for pid, piece in enumerate(pieces):
-        placeable_positions = [
-            piece_vars[pid][r][c]
-            for r, c in all_coordinates(board) if can_place(board, piece, r, c)
-        ]
-        # Since all are binary (0 or 1), the sum of all placeable positions equaling 1
-        # indicates that only one position was used.
-        yield lpSum(placeable_positions) == 1
+        cells = np.argwhere(np.asarray(piece) == 1)
+        # Every top-left corner where the piece fits on the board
+        placements = np.mgrid[0:height - rows + 1, 0:width - cols + 1].reshape(2, -1).T
+        placement_vars = piece_vars[pid][placements[:, 0], placements[:, 1]]
+        placeable.append(placement_vars.tolist())
+        all_hits.append((placements[:, None, :] + cells[None, :, :]).reshape(-1, 2))
+        all_vars.append(np.repeat(placement_vars, len(cells)))
+    hits, hit_vars = np.concatenate(all_hits), np.concatenate(all_vars)
 
+    touched_by = {(r, c): [] for r, c in all_coordinates(board)}
+    # No piece fits anywhere on the board
+    if len(hits) == 0:
+        return placeable, touched_by
+
+    order = np.lexsort((hits[:, 1], hits[:, 0]))
+    hits, hit_vars = hits[order], hit_vars[order]
+    boundaries = np.flatnonzero(np.any(hits[1:] != hits[:-1], axis=1)) + 1
+
+    for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(hits)]):
+        r, c = hits[start].tolist()
+        touched_by[(r, c)] = hit_vars[start:end].tolist()
+    return placeable, touched_by
+
+
+def each_piece_used_once(placeable, counts):
+    """Constraints for each piece being used exactly once on the board.
+
+    Identical pieces share their decision variables, so their positions add up to how many of them there are.
+    """
+    for placeable_positions, count in zip(placeable, counts):
+        # For a piece that appears once all are binary (0 or 1), so the sum of all placeable positions
+        # equaling 1 indicates that only one position was used.
+        yield LpAffineExpression({var: 1 for var in placeable_positions}) == count
+
+
+def group_identical_pieces(pieces):
+    """Groups the pieces that are exactly the same.
+
+    Returns each distinct piece and how many times it appears, in order of first appearance.
+    """
+    counts = Counter(tuple(map(tuple, piece)) for piece in pieces)
+    return [[list(row) for row in piece] for piece in counts], list(counts.values())
 
-def all_cells_are_zero(touched_by, board, flips, pieces):
-    """Constraints for each coordinate on the board, after placing all pieces, end up as the 0 shape. """
-    board_coords = list(all_coordinates(board))
 
+def greedy_warm_start(piece_vars, m, touched_by, board, pieces, counts, flips):
+    """Sets the initial values of the variables from a random greedy placement, as a warm start for CBC.
+
+    Each piece goes in a random position that doesn't overshoot any cell, or one that overshoots the fewest.
+    The result is rarely a solution, in which case CBC ignores it.
+    """
+    height, width = len(board), len(board[0])
+    rng = np.random.default_rng()
+    # How many more flips each cell needs to get back to 0
+    remaining = -np.asarray(board) % flips
+    placed = np.zeros(piece_vars.shape, dtype=np.int64)
+    for pid, (piece, count) in enumerate(zip(pieces, counts)):
+        piece = np.asarray(piece, dtype=bool)
+        rows, cols = piece.shape
+        if rows > height or cols > width:
+            continue
+        for _ in range(count):
+            windows = sliding_window_view(remaining == 0, piece.shape)
+            overshoots = (windows & piece).sum(axis=(2, 3))
+            r, c = rng.choice(np.argwhere(overshoots == overshoots.min()))
+            remaining[r:r + rows, c:c + cols][piece] -= 1
+            remaining %= flips
+            placed[pid, r, c] += 1
+
+    for (pid, r, c), var in np.ndenumerate(piece_vars):
+        if var is not None:
+            var.setInitialValue(placed[pid, r, c])
+    for (r, c), var in m.items():
+        touched = sum(placement.varValue for placement in touched_by[(r, c)])
+        var.setInitialValue(min((touched + board[r][c]) // flips, var.upBound))
+
+
+def cell_multipliers(touched_by, board, flips, pieces):
+    """The m of each coordinate in all_cells_are_zero, with an upper bound as tight as we can make it."""
     # The equation board[r][c] % flips == 0 is equivalent to
     # board[r][c] == m * flips for all values of m.
     # but we can further constraint the value of m
-    kw = dict(
-        lowBound=0,
-        # This upperbound occurs when all pieces touch the same (r, c) spot
-        upBound=(len(pieces) + 1) // flips,
-        cat=LpInteger,
+    upper_bounds = {}
+    for r, c in all_coordinates(board):
+        if touched_by[(r, c)]:
+            # Each piece is placed once, so at most min(placements touching it, pieces)
+            # pieces can end up on (r, c). A placement of identical pieces counts as many times
+            # as it can be used.
+            touching = sum(var.upBound for var in touched_by[(r, c)])
+            max_touch = min(touching, len(pieces))
+            upper_bounds[(r, c)] = (max_touch + board[r][c]) // flips
+
+    # With an upper bound of 0 there is no m, and nothing may be placed on (r, c)
+    m = LpVariable.dicts(
+        "I", [cell for cell, upper in upper_bounds.items() if upper > 0], lowBound=0, cat=LpInteger
     )
-    m = {(r, c): LpVariable(f"I{r},{c}", **kw) for r, c in board_coords}
+    for cell, var in m.items():
+        var.upBound = upper_bounds[cell]
+    return m
 
-    for r, c in board_coords:
+
+def all_cells_are_zero(touched_by, board, flips, m):
+    """Constraints for each coordinate on the board, after placing all pieces, end up as the 0 shape. """
+    for r, c in all_coordinates(board):
         if touched_by[(r, c)]:
-            initial_state = [board[r][c]]
+            coefficients = {var: 1 for var in touched_by[(r, c)]}
+            if (r, c) in m:
+                coefficients[m[(r, c)]] = -flips
             divisable_by_flips = (
-                lpSum(touched_by[(r, c)] + initial_state) == m[(r, c)] * flips
+                LpAffineExpression(coefficients, constant=board[r][c]) == 0
             )
             yield divisable_by_flips
 
 
 def apply_piece(board, piece, r, c):
-    for i in range(len(piece)):
-        for j in range(len(piece[i])):
-            if piece[i][j] == 1:
-                board[r + i][c + j] += 1
+    """Adds a NumPy piece onto a NumPy board with its top left corner at (r, c)."""
+    height, width = piece.shape
+    board[r:r + height, c:c + width] += piece
 
 
 def apply_solution(board, piece_placements_var, pieces):
-    for i, piece_var in enumerate(piece_placements_var):
-        for r, c in all_coordinates(board):
-            if piece_var[r][c].value() == 1:
-                # print(f"Place piece {i} at col {c} row {r}")
-                apply_piece(board, pieces[i], r, c)
+    # Pull every placement's value out of PuLP once, as a (pid, row, col) array
+    values = np.array([
+        (var.value() or 0) if var is not None else 0 for var in piece_placements_var.flat
+    ])
+    values = values.round().astype(np.int8).reshape(piece_placements_var.shape)
+
+    placed = np.zeros((len(board), len(board[0])), dtype=np.int64)
+    for pid, r, c in np.argwhere(values > 0):
+        # print(f"Place piece {pid} at col {c} row {r}, {values[pid, r, c]} times")
+        apply_piece(placed, values[pid, r, c] * np.asarray(pieces[pid]), r, c)
+    board[:] = (np.asarray(board) + placed).tolist()
 
 
 def print_board(board, flips):
@@ -105,37 +179,43 @@ def solve(board, pieces, flips):
     Let m, n be the dimensions of the board, and pid be each piece.
 
     Decision variables:
-    - piece_row_col: Each piece has m x n binary decision variable of whether that piece was placed.
+    - piece_row_col: Each distinct piece has an integer decision variable in [0, count] for every r, c it fits in,
+      of how many copies of that piece were placed there. count is how many times the piece appears; for a
+      piece that appears once the variable is binary.
 
       We do not need to care about the order of placing the pieces. Placement of a piece is modeled
-      as addition, which is communnative.
+      as addition, which is communnative. For the same reason, copies of a piece are interchangeable, so
+      they share variables and the solver doesn't explore every permutation of them.
 
     Constraints:
-    - each_piece_used_once: Each piece can only be used once. That is, for any given pid, there can be only one pid_r_c that is == 1
+    - each_piece_used_once: Each piece can only be used once. That is, for any given pid, the pid_r_c add up to its count
     - all_cells_are_zero: For each coordinate on the board, the ending position must be the "0" shape. That is, the sum of all pieces that touched it must be evenly divisible by 5. 
 
     """
     prob = LpProblem("Shapeshifter", const.LpMinimize)
     # Represents a piece (pid) and all its possible placement positions for every row, column.
-    piece_row_col = [
-        [
-            [
-                LpVariable(f"P{pid}_{row}_{col}", cat=const.LpBinary)
-                for col in range(len(board[0]))
-            ]
-            for row in range(len(board))
-        ]
-        for pid in range(len(pieces))
-    ]
-    for constraint in each_piece_used_once(piece_row_col, board, pieces):
+    # Positions where the piece would hang off the board are left as None.
+    height, width = len(board), len(board[0])
+    shapes, counts = group_identical_pieces(pieces)
+    piece_row_col = np.full((len(shapes), height, width), None, dtype=object)
+    for pid, (piece, count) in enumerate(zip(shapes, counts)):
+        rows, cols = range(height - len(piece) + 1), range(width - len(piece[0]) + 1)
+        placement_vars = LpVariable.dicts(
+            f"P{pid}_%s_%s", (rows, cols), lowBound=0, upBound=count, cat=const.LpInteger
+        )
+        for row, col in product(rows, cols):
+            piece_row_col[pid, row, col] = placement_vars[row][col]
+    placeable, touched_by = map_placements(piece_row_col, board, shapes)
+    for constraint in each_piece_used_once(placeable, counts):
         prob += constraint
-    touched_by = map_cells_to_pieces(piece_row_col, board, pieces)
-    for constraint in all_cells_are_zero(touched_by, board, flips, pieces):
+    m = cell_multipliers(touched_by, board, flips, pieces)
+    for constraint in all_cells_are_zero(touched_by, board, flips, m):
         prob += constraint
+    greedy_warm_start(piece_row_col, m, touched_by, board, shapes, counts, flips)
 
-    prob.solve()
+    prob.solve(get_solver(warmStart=True))
     print(LpStatus[prob.status])
-    apply_solution(board, piece_row_col, pieces)
+    apply_solution(board, piece_row_col, shapes)
     print_board(board, flips)
 
 
@@ -1,46 +1,72 @@
+import io
+import numpy as np
 from pulp import *
-
-prob = LpProblem("Sudoku", const.LpMinimize)
-
-# Constraints
-grid_vars = [[[0 for _ in range(9)] for _ in range(9)] for _ in range(9)]
-
-for r in range(9):
-    for c in range(9):
-        for v in range(9):
-            grid_vars[r][c][v] = LpVariable(f"{r},{c},{v}", cat=LpBinary)
-
-# We can only have 1 value per cell
-for r in range(9):
-    for c in range(9):
-        prob += lpSum([grid_vars[r][c][v] for v in range(9)]) == 1, f"val_{r}{c}"
-
-# 1 of each per row
-for r in range(9):
-    for v in range(9):
-        prob += lpSum([grid_vars[r][c][v] for c in range(9)]) == 1
-
-# 1 of each per  col
-for c in range(9):
-    for v in range(9):
-        prob += lpSum([grid_vars[r][c][v] for r in range(9)]) == 1
-
-# 1 of each per box
-box = []
-for i in range(3):
-    for j in range(3):
-        box.append([i, j])
-
-for v in range(9):
-    for i in range(3):
-        for j in range(3):
-            print("box", i, j, ":", [(3 * i + dy, 3 * j + dx) for dy, dx in box])
-            prob += (
-                lpSum([grid_vars[3 * i + dy][3 * j + dx][v] for (dy, dx) in box]) == 1
-            )
-
-
-# The starting numbers are entered as constraints
+from lp_cbc import run_cbc
+
+# The model is a fixed exact cover matrix: one binary column per (row, col, value) and
+# four blocks of 81 constraint rows, each saying something is covered exactly once.
+grid_r, grid_c, grid_v = np.unravel_index(np.arange(9 * 9 * 9), (9, 9, 9))
+grid_box = 3 * (grid_r // 3) + grid_c // 3
+
+# Constraint row of each column's four nonzeros, all with a coefficient of 1
+constraint_rows = np.stack(
+    [
+        # We can only have 1 value per cell
+        9 * grid_r + grid_c,
+        # 1 of each per row
+        81 + 9 * grid_r + grid_v,
+        # 1 of each per col
+        162 + 9 * grid_c + grid_v,
+        # 1 of each per box
+        243 + 9 * grid_box + grid_v,
+    ],
+    axis=1,
+)
+
+
+def column_name(r, c, v):
+    return f"X{r}{c}{v}"
+
+
+# The matrix doesn't change, so neither do the names of its columns
+column_names = [column_name(r, c, v) for r, c, v in zip(grid_r, grid_c, grid_v)]
+
+
+def write_mps(f, givens):
+    """Writes the exact cover matrix as an MPS file, reduced by the givens.
+
+    The rows a given covers are already satisfied, and every other column in those rows has to be 0,
+    so both are left out. What's left is only the part of the puzzle the givens don't decide.
+    """
+    given_cols = [81 * r + 9 * c + v for r, c, v in givens]
+    covered = np.zeros(4 * 81, dtype=bool)
+    covered[constraint_rows[given_cols]] = True
+    free_cols = np.flatnonzero(~covered[constraint_rows].any(axis=1))
+    free_rows = np.flatnonzero(~covered)
+
+    f.write("NAME          SUDOKU\nROWS\n N  OBJ\n")
+    for row in free_rows:
+        f.write(f" E  R{row}\n")
+
+    f.write("COLUMNS\n    MARKER  'MARKER'  'INTORG'\n")
+    for col in free_cols:
+        name = column_names[col]
+        rows = constraint_rows[col]
+        f.write(f"    {name}  R{rows[0]}  1  R{rows[1]}  1\n")
+        f.write(f"    {name}  R{rows[2]}  1  R{rows[3]}  1\n")
+    f.write("    MARKER  'MARKER'  'INTEND'\n")
+
+    f.write("RHS\n")
+    for row in free_rows:
+        f.write(f"    RHS  R{row}  1\n")
+
+    f.write("BOUNDS\n")
+    for col in free_cols:
+        f.write(f" UP BND  {column_names[col]}  1\n")
+    f.write("ENDATA\n")
+
+
+# The starting numbers are taken out of the model, see write_mps
 input_data = [
     (5, 1, 1),
     (6, 2, 1),
@@ -73,25 +99,26 @@ input_data = [
     (5, 8, 9),
 ]
 
-for (v, r, c) in input_data:
-    prob += grid_vars[r - 1][c - 1][v - 1] == 1
+givens = {(r - 1, c - 1, v - 1) for v, r, c in input_data}
 
+model = io.StringIO()
+write_mps(model, givens)
+status, values = run_cbc(model.getvalue(), "sudoku.mps")
+print("Status:", LpStatus[status])
 
-prob.solve()
-print("Status:", LpStatus[prob.status])
+# CBC only lists the columns that are nonzero, so these are the chosen values
+chosen = list(givens)
+for name, value in values.items():
+    if value == 1:
+        chosen.append(tuple(int(x) for x in name[1:]))
 
 board = [[None for i in range(9)] for j in range(9)]
 
-for i in range(9):
-    for j in range(9):
-        v = None
-        for k in range(9):
-            if grid_vars[i][j][k].value() == 1:
-                if v is not None:
-                    print("error")
-                else:
-                    v = k
-                    board[i][j] = k + 1
+for i, j, k in chosen:
+    if board[i][j] is not None:
+        print("error")
+    else:
+        board[i][j] = k + 1
 
 for row in board:
     for col in row: